@@ -0,0 +1,76 @@
+"""
+adaptive_limiter.py
+───────────────────
+AIMD concurrency limiter for outbound API calls.
+
+Works like TCP congestion control: the number of concurrent requests grows
+by one after a full window of successes and halves when the provider signals
+overload (e.g. ``RateLimitError``).  Requests beyond the current limit wait
+for a free slot instead of being sent into a guaranteed 429.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import AsyncIterator
+
+
+class AdaptiveLimiter:
+    """
+    Additive-increase / multiplicative-decrease concurrency limiter.
+
+    Use ``async with limiter.slot(): ...`` around each outbound request.
+    Leaving the block normally counts as a success; leaving it with one of
+    the *overload* exceptions shrinks the limit.  Other exceptions leave the
+    limit unchanged.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        maximum: int,
+        overload: tuple[type[BaseException], ...],
+        minimum: int = 1,
+    ) -> None:
+        self._min = max(1, minimum)
+        self._max = max(self._min, maximum)
+        self._limit = min(max(initial, self._min), self._max)
+        self._overload = overload
+        self._in_flight = 0
+        self._successes = 0
+        # Bumped on every decrease so a burst of 429s from requests that were
+        # already in flight only halves the limit once.
+        self._epoch = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current maximum number of concurrent requests."""
+        return self._limit
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for a free request slot and hold it for the enclosed block."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+            epoch = self._epoch
+
+        try:
+            yield
+        except self._overload:
+            if epoch == self._epoch:
+                self._limit = max(self._min, self._limit // 2)
+                self._successes = 0
+                self._epoch += 1
+            raise
+        else:
+            self._successes += 1
+            if self._successes >= self._limit:
+                self._limit = min(self._max, self._limit + 1)
+                self._successes = 0
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
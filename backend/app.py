@@ -1,51 +1,237 @@
+import asyncio
+import atexit
+import hashlib
 import logging
+import logging.handlers
 import os
+import queue
+import tempfile
 from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
 
+import aiofiles
+import redis.asyncio as redis
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, StreamingResponse
 
 from groq_client import groq_client
 from cerebrus_client import cerebrus_client
+from prompt_template import load_encoding
+from stores import (
+    AudioFileCache,
+    MemoryStore,
+    RedisStore,
+    VersionedTTLCache,
+    sweep_audio_dir,
+    unlink_quietly,
+)
 
 # ---------------------------------------------------------------------------
-# Logging
+# Logging — records are queued by the caller and written to stderr by a
+# QueueListener thread, so request coroutines never block on stream I/O.
 # ---------------------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s  %(levelname)-8s  %(name)s — %(message)s",
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(
+    logging.Formatter("%(asctime)s  %(levelname)-8s  %(name)s — %(message)s")
 )
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+# Only merge args into the message here; the listener applies the layout
+_log_enqueue = logging.handlers.QueueHandler(_log_queue)
+_log_enqueue.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[_log_enqueue])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 # ---------------------------------------------------------------------------
-# In-memory stores
+# Stores — keyed by SHA-256 of the WAV payload.  In-process bounded LRU + TTL
+# by default; set REDIS_URL to share them between workers (see stores.py).
+# Override via STORE_MAXSIZE / STORE_TTL_SECONDS / REDIS_URL env vars.
+# ---------------------------------------------------------------------------
+STORE_MAXSIZE: int = int(os.getenv("STORE_MAXSIZE", "256"))
+STORE_TTL_SECONDS: int = int(os.getenv("STORE_TTL_SECONDS", "3600"))
+REDIS_URL: str = os.getenv("REDIS_URL", "").strip()
+
+# Uploaded WAVs are spooled to disk here; only their metadata is stored.
+# With REDIS_URL set this must be a volume shared by every worker.
+AUDIO_DIR: str = os.getenv("AUDIO_DIR", "").strip() or os.path.join(
+    tempfile.gettempdir(), "discord-bot-audio"
+)
+UPLOAD_CHUNK_SIZE: int = 64 * 1024
+AUDIO_SWEEP_INTERVAL_SECONDS: int = 60
+
+# Wait between attempts to load the tiktoken encoding when it is unavailable
+ENCODING_RETRY_SECONDS: int = 300
+
+redis_client: redis.Redis | None = None
+audio_store: MemoryStore | RedisStore
+transcript_store: MemoryStore | RedisStore
+llm_store: MemoryStore | RedisStore
+
+if REDIS_URL:
+    # redis-py picks up the hiredis parser automatically when it is installed
+    redis_client = redis.Redis.from_url(REDIS_URL)
+    audio_store = RedisStore(redis_client, "audio", "audio", STORE_TTL_SECONDS)
+    transcript_store = RedisStore(
+        redis_client, "transcript", "transcript", STORE_TTL_SECONDS
+    )
+    llm_store = RedisStore(redis_client, "analysis", "analysis", STORE_TTL_SECONDS)
+else:
+    audio_store = MemoryStore(AudioFileCache(STORE_MAXSIZE, STORE_TTL_SECONDS), "audio")
+    transcript_store = MemoryStore(
+        VersionedTTLCache(STORE_MAXSIZE, STORE_TTL_SECONDS), "transcript"
+    )
+    llm_store = MemoryStore(
+        VersionedTTLCache(STORE_MAXSIZE, STORE_TTL_SECONDS), "analysis"
+    )
+
+cache_stats: dict[str, int] = {"hits": 0, "misses": 0}
+
+T = TypeVar("T")
+
+
+# ---------------------------------------------------------------------------
+# Single-flight — concurrent duplicate uploads share one in-flight API call
 # ---------------------------------------------------------------------------
-audio_store: dict[str, bytes] = {}
-transcript_store: dict[str, str] = {}
-llm_store: dict[str, dict] = {}
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one underlying call.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it is still running await that same task instead of issuing their
+    own request.  The task is shielded so one caller disconnecting does not
+    cancel the work for the others.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+
+transcribe_flight = SingleFlight()
+analysis_flight = SingleFlight()
 
 
 # ---------------------------------------------------------------------------
 # FastAPI lifespan — init / close GroqClient around server lifetime
 # ---------------------------------------------------------------------------
+async def _sweep_audio_forever() -> None:
+    """
+    Periodically delete spooled WAVs that have outlived the store TTL.
+
+    Needed with Redis, where entries expire without any process seeing it,
+    and in memory mode for files left behind by a restart or a crash
+    between spooling and storing.  The first sweep runs at startup.
+    """
+    # One interval of grace so a file never disappears before its metadata
+    max_age = STORE_TTL_SECONDS + AUDIO_SWEEP_INTERVAL_SECONDS
+    while True:
+        try:
+            await asyncio.to_thread(sweep_audio_dir, AUDIO_DIR, max_age)
+        except OSError as exc:
+            logger.error("[Stores] Audio sweep failed: %s", exc)
+        await asyncio.sleep(AUDIO_SWEEP_INTERVAL_SECONDS)
+
+
+async def _warm_encoding() -> None:
+    """
+    Load the tiktoken encoding in a worker thread, so its download never
+    blocks the event loop, retrying until it succeeds.
+    """
+    while not await asyncio.to_thread(load_encoding):
+        await asyncio.sleep(ENCODING_RETRY_SECONDS)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("[Server] Starting up — initialising clients…")
+    os.makedirs(AUDIO_DIR, exist_ok=True)
     groq_client.init()
     cerebrus_client.init()
+    if redis_client is not None:
+        logger.info("[Server] Using Redis stores")
+    sweeper = asyncio.create_task(_sweep_audio_forever())
+    warmer = asyncio.create_task(_warm_encoding())
     yield
     logger.info("[Server] Shutting down — closing clients…")
-    groq_client.close()
-    cerebrus_client.close()
+    sweeper.cancel()
+    warmer.cancel()
+    await groq_client.close()
+    await cerebrus_client.close()
+    if redis_client is not None:
+        await redis_client.aclose()
 
 
 app = FastAPI(lifespan=lifespan)
 
 
+# ---------------------------------------------------------------------------
+# Upload spooling
+# ---------------------------------------------------------------------------
+
+
+async def _spool_upload(upload: UploadFile) -> tuple[str, str, int]:
+    """
+    Stream *upload* chunk by chunk into a new file under ``AUDIO_DIR``,
+    hashing it on the way.  Returns ``(sha256_hex, path, size_bytes)``.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=AUDIO_DIR, suffix=".wav")
+    os.close(fd)
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                await out.write(chunk)
+    except BaseException:
+        unlink_quietly(path)
+        raise
+    return digest.hexdigest(), path, size
+
+
+# ---------------------------------------------------------------------------
+# JSON list streaming
+# ---------------------------------------------------------------------------
+STREAM_BATCH_SIZE: int = 64
+
+
+async def _stream_json_array(fragments: list[bytes]) -> AsyncIterator[bytes]:
+    """
+    Yield a JSON array of pre-serialised elements in batches, so large
+    listings go out as several writes that interleave with other requests.
+    """
+    yield b"["
+    for start in range(0, len(fragments), STREAM_BATCH_SIZE):
+        if start:
+            yield b","
+        yield b",".join(fragments[start : start + STREAM_BATCH_SIZE])
+    yield b"]"
+
+
+async def _json_list_response(store: MemoryStore | RedisStore) -> StreamingResponse:
+    return StreamingResponse(
+        _stream_json_array(await store.fragments()), media_type="application/json"
+    )
+
+
 # ---------------------------------------------------------------------------
 # Routes
 # ---------------------------------------------------------------------------
@@ -69,47 +255,88 @@ async def receive_audio(
     channels: int = Form(...),
     timestamp: datetime = Form(...),
 ):
-    wav_bytes = await audio.read()
-    file_id = audio.filename
-    audio_store[file_id] = wav_bytes
+    # Content hash, not the client-supplied filename: identical uploads share
+    # one entry and clients cannot overwrite each other's clips.
+    file_id, path, size = await _spool_upload(audio)
+
+    # Keep the first copy of a clip on disk; drop a duplicate's spool file.
+    entry = await audio_store.get(file_id)
+    if entry is None:
+        entry = {"path": path, "size": size}
+        if redis_client is None:
+            # Stat once here so downloads don't pay a stat() per request
+            entry["stat"] = os.stat(path)
+        await audio_store.set(file_id, entry)
+    else:
+        unlink_quietly(path)
+    audio_path = entry["path"]
 
     logger.info(
-        "[Audio] Received %s — user=%s guild=%s size=%d bytes",
+        "[Audio] Received %s (%s) — user=%s guild=%s size=%d bytes",
         file_id,
+        audio.filename,
         userId,
         guildId,
-        len(wav_bytes),
+        size,
     )
 
+    transcript: str | None = await transcript_store.get(file_id)
+    llm_result: dict | None = await llm_store.get(file_id)
+
+    if transcript is not None and llm_result is not None:
+        cache_stats["hits"] += 1
+        logger.info("[Cache] Hit for %s — skipping transcription and LLM", file_id)
+        return {
+            "received": True,
+            "file_id": file_id,
+            "filename": audio.filename,
+            "size_bytes": size,
+            "userId": userId,
+            "guildId": guildId,
+            "transcript": transcript,
+            "analysis": llm_result,
+        }
+
+    cache_stats["misses"] += 1
+
+    # Built up front: the LLM prompt is the only step that depends on the
+    # transcript, so nothing else should sit between the two API calls.
+    meta = {
+        "user_id": userId,
+        "guild": guildId,
+        "timestamp": timestamp.isoformat(),
+        "duration_ms": durationMs,
+    }
+
     # ── Transcription ──────────────────────────────────────────────────────
-    transcript: str | None = None
-    try:
-        transcript = await groq_client.transcribe(wav_bytes, filename=file_id)
-        transcript_store[file_id] = transcript
-        logger.info("[Transcription] Stored transcript for %s", file_id)
-    except Exception as exc:
-        logger.error("[Transcription] Failed for %s: %s", file_id, exc)
+    if transcript is None:
+        try:
+            transcript = await transcribe_flight.do(
+                file_id,
+                lambda: groq_client.transcribe(audio_path, filename=f"{file_id}.wav"),
+            )
+            await transcript_store.set(file_id, transcript)
+            logger.info("[Transcription] Stored transcript for %s", file_id)
+        except Exception as exc:
+            logger.error("[Transcription] Failed for %s: %s", file_id, exc)
 
     # ── LLM analysis ───────────────────────────────────────────────────────
-    llm_result: dict | None = None
-    if transcript:
+    if transcript and llm_result is None:
         try:
-            meta = {
-                "user_id": userId,
-                "guild": guildId,
-                "timestamp": timestamp.isoformat(),
-                "duration_ms": durationMs,
-            }
-            llm_result = await cerebrus_client.process(transcript, metadata=meta)
-            llm_store[file_id] = llm_result
+            llm_result = await analysis_flight.do(
+                file_id,
+                lambda: cerebrus_client.process(transcript, metadata=meta),
+            )
+            await llm_store.set(file_id, llm_result)
             logger.info("[LLM] Stored analysis for %s", file_id)
         except Exception as exc:
             logger.error("[LLM] Analysis failed for %s: %s", file_id, exc)
 
     return {
         "received": True,
-        "filename": file_id,
-        "size_bytes": len(wav_bytes),
+        "file_id": file_id,
+        "filename": audio.filename,
+        "size_bytes": size,
         "userId": userId,
         "guildId": guildId,
         "transcript": transcript,
@@ -122,13 +349,25 @@ async def receive_audio(
 
 @app.get("/audio/{file_id}")
 async def get_audio(file_id: str):
-    if file_id not in audio_store:
+    entry = await audio_store.get(file_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Audio not found")
 
-    return Response(
-        content=audio_store[file_id],
+    stat = entry.get("stat")
+    if stat is None:
+        # Redis entries carry no stat; the file may also have been swept
+        try:
+            stat = os.stat(entry["path"])
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Audio not found")
+
+    # Starlette streams the file from disk, or hands it to the server via the
+    # ASGI pathsend extension (sendfile) when the server supports it.
+    return FileResponse(
+        entry["path"],
         media_type="audio/wav",
-        headers={"Content-Disposition": f'attachment; filename="{file_id}"'},
+        filename=f"{file_id}.wav",
+        stat_result=stat,
     )
 
 
@@ -138,18 +377,17 @@ async def get_audio(file_id: str):
 @app.get("/transcriptions")
 async def list_transcriptions():
     """Return a summary list of all stored transcriptions."""
-    return [
-        {"file_id": fid, "transcript": text} for fid, text in transcript_store.items()
-    ]
+    return await _json_list_response(transcript_store)
 
 
 @app.get("/transcriptions/{file_id}")
 async def get_transcription(file_id: str):
     """Retrieve the transcript for a specific audio file."""
-    if file_id not in transcript_store:
+    transcript = await transcript_store.get(file_id)
+    if transcript is None:
         raise HTTPException(status_code=404, detail="Transcript not found")
 
-    return {"file_id": file_id, "transcript": transcript_store[file_id]}
+    return {"file_id": file_id, "transcript": transcript}
 
 
 # ── LLM analysis retrieval ───────────────────────────────────────────────────
@@ -158,13 +396,48 @@ async def get_transcription(file_id: str):
 @app.get("/analysis")
 async def list_analyses():
     """Return a list of all stored LLM analyses."""
-    return [{"file_id": fid, "analysis": result} for fid, result in llm_store.items()]
+    return await _json_list_response(llm_store)
 
 
 @app.get("/analysis/{file_id}")
 async def get_analysis(file_id: str):
     """Retrieve the LLM analysis for a specific audio file."""
-    if file_id not in llm_store:
+    analysis = await llm_store.get(file_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
-    return {"file_id": file_id, "analysis": llm_store[file_id]}
+    return {"file_id": file_id, "analysis": analysis}
+
+
+# ── Metrics ──────────────────────────────────────────────────────────────────
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Return cache hit/miss counters and current store sizes."""
+    return {
+        "cache": dict(cache_stats),
+        "llm_cache": cerebrus_client.stats,
+        "stores": {
+            "audio": await audio_store.size(),
+            "transcripts": await transcript_store.size(),
+            "analyses": await llm_store.size(),
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# Entrypoint — `python app.py` runs uvicorn pinned to the uvloop event loop
+# (uvicorn's default "auto" only uses uvloop when it happens to be installed)
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "app:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        # More than one worker needs REDIS_URL, or each keeps its own stores
+        workers=int(os.getenv("WORKERS", "1")),
+        loop="uvloop",
+    )
@@ -5,7 +5,7 @@ GPT-OSS-120B with automatic API-key rotation and retry logic.
 Lifecycle
 ---------
 Call ``cerebrus_client.init()`` once at server startup (inside FastAPI lifespan).
-Call ``cerebrus_client.close()`` once at server shutdown.
+Call ``await cerebrus_client.close()`` once at server shutdown.
 Then call ``await cerebrus_client.process(transcript, metadata)`` from any
 request handler.
 """
@@ -13,20 +13,27 @@ request handler.
 from __future__ import annotations
 
 import asyncio
-import itertools
-import json
+import hashlib
 import logging
 import os
-from typing import Iterator
+import random
+from collections import OrderedDict
+from typing import Any, Mapping
 
+import httpx
+import orjson
 from cerebras.cloud.sdk import (
     AsyncCerebras,
     APIConnectionError,
     APIStatusError,
+    DefaultAsyncHttpxClient,
     RateLimitError,
 )
 
-from prompt_template import SYSTEM_PROMPT, build_user_message
+from prompt_template import SYSTEM_PROMPT, build_messages
+from adaptive_limiter import AdaptiveLimiter
+from key_rotation import KeyRotation
+from race import first_success
 
 logger = logging.getLogger(__name__)
 
@@ -35,20 +42,101 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 DEFAULT_MODEL: str = "gpt-oss-120b"
 
+# ---------------------------------------------------------------------------
+# Completion budget — Cerebras reserves max_completion_tokens against the
+# token rate limit up front, so ask for little more than replies really use:
+# start at the default, then track a moving average of observed completion
+# lengths and request 1.5× that, within [DEFAULT, MAX].
+# ---------------------------------------------------------------------------
+DEFAULT_COMPLETION_TOKENS: int = 512
+MAX_COMPLETION_TOKENS: int = 1024
+COMPLETION_HEADROOM: float = 1.5
+COMPLETION_EMA_ALPHA: float = 0.2
+
+# Identifies this integration to Cerebras on every request
+DEFAULT_HEADERS: dict[str, str] = {"X-Cerebras-3rd-Party-Integration": "discord-bot"}
+
+# ---------------------------------------------------------------------------
+# Connection pool shared by every per-key AsyncCerebras instance
+# ---------------------------------------------------------------------------
+HTTP_LIMITS: httpx.Limits = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=50,
+)
+
+# ---------------------------------------------------------------------------
+# Response cache default — override via CEREBRAS_CACHE_SIZE env var (0 = off)
+# ---------------------------------------------------------------------------
+DEFAULT_CACHE_SIZE: int = 256
+
+# ---------------------------------------------------------------------------
+# Retry fan-out — how many keys a retry wave races in parallel.
+# Override via CEREBRAS_RACE_FACTOR env var (1 = plain sequential rotation).
+# ---------------------------------------------------------------------------
+DEFAULT_RACE_FACTOR: int = 2
+
+# ---------------------------------------------------------------------------
+# Adaptive concurrency — AIMD limit on in-flight requests, halved on 429s.
+# Override via CEREBRAS_INITIAL_CONCURRENCY / CEREBRAS_MAX_CONCURRENCY env vars.
+# ---------------------------------------------------------------------------
+DEFAULT_INITIAL_CONCURRENCY: int = 4
+DEFAULT_MAX_CONCURRENCY: int = 32
+
+# ---------------------------------------------------------------------------
+# Exponential backoff with jitter between retry waves
+# ---------------------------------------------------------------------------
+BACKOFF_BASE_SECONDS: float = 0.1
+BACKOFF_MAX_SECONDS: float = 5.0
+BACKOFF_JITTER_SECONDS: float = 0.1
+
+# Errors that rotate to the next key instead of failing the call
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    RateLimitError,
+    APIStatusError,
+    APIConnectionError,
+)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Seconds to wait before the next retry wave: capped exponential + jitter."""
+    return min(BACKOFF_BASE_SECONDS * 2**attempt, BACKOFF_MAX_SECONDS) + (
+        random.random() * BACKOFF_JITTER_SECONDS
+    )
+
 
 class CerebrusClient:
     """
     Singleton-style client for the Cerebras Cloud API.
 
-    Manages a pool of ``AsyncCerebras`` clients (one per API key) and rotates
-    through them round-robin.  On any rate-limit or API error the next key is
-    tried automatically before the call is considered failed.
+    Manages a pool of ``AsyncCerebras`` clients (one per API key) sharing a
+    single ``httpx.AsyncClient`` connection pool, and rotates through them
+    round-robin.  On any rate-limit or API error the next key is
+    tried automatically before the call is considered failed; a rate-limited
+    key is skipped until its Retry-After has elapsed.
     """
 
     def __init__(self) -> None:
+        self._http: httpx.AsyncClient | None = None
         self._clients: list[AsyncCerebras] = []
-        self._client_iter: Iterator[AsyncCerebras] | None = None
+        self._rotation: KeyRotation | None = None
         self._model: str = DEFAULT_MODEL
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._cache_lock = asyncio.Lock()
+        self._cache_size: int = DEFAULT_CACHE_SIZE
+        self._cache_nondeterministic: bool = False
+        self._compress_transcript: bool = False
+        self._avg_completion_tokens: float | None = None
+        self._stats: dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "cached_prompt_tokens": 0,
+        }
+        self._race_factor: int = DEFAULT_RACE_FACTOR
+        self._limiter = AdaptiveLimiter(
+            DEFAULT_INITIAL_CONCURRENCY,
+            DEFAULT_MAX_CONCURRENCY,
+            overload=(RateLimitError,),
+        )
 
     # ------------------------------------------------------------------
     # Lifecycle helpers
@@ -64,10 +152,35 @@ class CerebrusClient:
         CEREBRAS_API_KEY    – single Cerebras API key
         CEREBRAS_API_KEYS   – comma-separated list of Cerebras API keys
         CEREBRAS_MODEL      – LLM model ID to use (default: gpt-oss-120b)
+        CEREBRAS_CACHE_SIZE – max cached responses, 0 disables (default: 256)
+        CEREBRAS_CACHE_NONDETERMINISTIC
+                            – "true" to also cache calls with temperature > 0
+        CEREBRAS_COMPRESS_TRANSCRIPT
+                            – "true" to strip speaker tags and filler sounds
+                              from transcripts before sending them
+        CEREBRAS_RACE_FACTOR
+                            – keys raced in parallel per retry wave (default: 2)
+        CEREBRAS_INITIAL_CONCURRENCY / CEREBRAS_MAX_CONCURRENCY
+                            – adaptive in-flight request limit (default: 4 / 32)
 
         At least one API key must be present.
         """
         self._model = os.getenv("CEREBRAS_MODEL", DEFAULT_MODEL).strip()
+        self._cache_size = int(os.getenv("CEREBRAS_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+        self._cache_nondeterministic = os.getenv(
+            "CEREBRAS_CACHE_NONDETERMINISTIC", ""
+        ).strip().lower() in ("1", "true", "yes")
+        self._compress_transcript = os.getenv(
+            "CEREBRAS_COMPRESS_TRANSCRIPT", ""
+        ).strip().lower() in ("1", "true", "yes")
+        self._race_factor = max(
+            1, int(os.getenv("CEREBRAS_RACE_FACTOR", DEFAULT_RACE_FACTOR))
+        )
+        self._limiter = AdaptiveLimiter(
+            int(os.getenv("CEREBRAS_INITIAL_CONCURRENCY", DEFAULT_INITIAL_CONCURRENCY)),
+            int(os.getenv("CEREBRAS_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            overload=(RateLimitError,),
+        )
 
         api_keys = self._load_api_keys()
         if not api_keys:
@@ -76,21 +189,50 @@ class CerebrusClient:
                 "Set CEREBRAS_API_KEY and/or CEREBRAS_API_KEYS in your environment."
             )
 
-        self._clients = [AsyncCerebras(api_key=key) for key in api_keys]
-        self._client_iter = itertools.cycle(self._clients)
+        # One keep-alive pool for all keys; auth headers are set per request.
+        # The SDK's TCP warm-up opens a throwaway sync connection, so doing it
+        # once is enough regardless of how many keys are configured.
+        self._http = DefaultAsyncHttpxClient(limits=HTTP_LIMITS)
+        self._clients = [
+            AsyncCerebras(
+                api_key=key,
+                http_client=self._http,
+                default_headers=DEFAULT_HEADERS,
+                warm_tcp_connection=(index == 0),
+            )
+            for index, key in enumerate(api_keys)
+        ]
+        self._rotation = KeyRotation(len(self._clients))
 
         logger.info(
-            "[CerebrusClient] Initialised — %d key(s), model=%s",
+            "[CerebrusClient] Initialised — %d key(s), model=%s, cache=%d",
             len(self._clients),
             self._model,
+            self._cache_size,
         )
 
-    def close(self) -> None:
-        """Release all resources and reset internal state."""
+    async def close(self) -> None:
+        """Close every ``AsyncCerebras`` client and the shared pool, then reset state."""
+        results = await asyncio.gather(
+            *(client.close() for client in self._clients),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("[CerebrusClient] Error closing client: %s", result)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
         self._clients.clear()
-        self._client_iter = None
+        self._rotation = None
+        self._cache.clear()
         logger.info("[CerebrusClient] Shut down cleanly.")
 
+    @property
+    def stats(self) -> dict[str, int]:
+        """Snapshot of response-cache and provider prompt-cache counters."""
+        return dict(self._stats)
+
     # ------------------------------------------------------------------
     # Key rotation
     # ------------------------------------------------------------------
@@ -103,26 +245,86 @@ class CerebrusClient:
           2. ``CEREBRAS_API_KEYS`` (comma-separated list)
         Duplicates are removed while preserving insertion order.
         """
-        seen: set[str] = set()
-        keys: list[str] = []
-
-        for raw in [
+        parts = [
             os.getenv("CEREBRAS_API_KEY", ""),
             *os.getenv("CEREBRAS_API_KEYS", "").split(","),
-        ]:
-            key = raw.strip()
-            if key and key not in seen:
-                seen.add(key)
-                keys.append(key)
+        ]
+        # dict.fromkeys de-duplicates in one pass and keeps first-seen order
+        return list(dict.fromkeys(key for raw in parts if (key := raw.strip())))
 
-        return keys
-
-    def _next_client(self) -> AsyncCerebras:
-        if self._client_iter is None:
+    def _next_clients(self, count: int) -> list[int]:
+        """
+        Up to *count* distinct key indices for one wave, skipping keys in
+        rate-limit cooldown.
+        """
+        if self._rotation is None:
             raise RuntimeError(
                 "CerebrusClient has not been initialised. Call init() first."
             )
-        return next(self._client_iter)
+        return self._rotation.next_indices(count)
+
+    # ------------------------------------------------------------------
+    # Completion budget
+    # ------------------------------------------------------------------
+
+    def _completion_budget(self) -> int:
+        if self._avg_completion_tokens is None:
+            return DEFAULT_COMPLETION_TOKENS
+        wanted = int(self._avg_completion_tokens * COMPLETION_HEADROOM)
+        return min(MAX_COMPLETION_TOKENS, max(DEFAULT_COMPLETION_TOKENS, wanted))
+
+    def _record_completion_tokens(self, tokens: int) -> None:
+        if self._avg_completion_tokens is None:
+            self._avg_completion_tokens = float(tokens)
+        else:
+            self._avg_completion_tokens += COMPLETION_EMA_ALPHA * (
+                tokens - self._avg_completion_tokens
+            )
+
+    # ------------------------------------------------------------------
+    # Response cache
+    # ------------------------------------------------------------------
+
+    def _cache_enabled(self, temperature: float) -> bool:
+        """Only deterministic calls are cached unless explicitly opted in."""
+        return self._cache_size > 0 and (
+            temperature == 0 or self._cache_nondeterministic
+        )
+
+    def _cache_key(
+        self,
+        user_message: str,
+        temperature: float,
+        max_completion_tokens: int | None,
+    ) -> str:
+        payload = orjson.dumps(
+            {
+                "model": self._model,
+                "system_prompt": SYSTEM_PROMPT,
+                "user_message": user_message,
+                "temperature": temperature,
+                "max_completion_tokens": max_completion_tokens,
+            },
+            option=orjson.OPT_SORT_KEYS,
+        )
+        return hashlib.sha256(payload).hexdigest()
+
+    async def _cache_get(self, key: str) -> dict | None:
+        async with self._cache_lock:
+            result = self._cache.get(key)
+            if result is None:
+                self._stats["misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return result
+
+    async def _cache_put(self, key: str, result: dict) -> None:
+        async with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
 
     # ------------------------------------------------------------------
     # LLM processing
@@ -131,30 +333,35 @@ class CerebrusClient:
     async def process(
         self,
         transcript: str,
-        metadata: dict | None = None,
+        metadata: Mapping[str, Any] | None = None,
         temperature: float = 0.2,
-        max_completion_tokens: int = 1024,
+        max_completion_tokens: int | None = None,
     ) -> dict:
         """
         Send *transcript* through the Cerebras GPT-OSS-120B model and return a
         structured analysis dict.
 
         The system prompt and user message are built from ``prompt_template.py``.
-        Keys rotate automatically on rate-limit or API errors.
+        Keys rotate automatically on rate-limit or API errors; after the first
+        failure each retry wave races up to ``CEREBRAS_RACE_FACTOR`` keys and
+        keeps the first success.  Deterministic calls are served from an
+        in-process LRU cache when the exact same prompt has been answered
+        before.
 
         Parameters
         ----------
         transcript:
             Raw text from the Whisper transcription step.
         metadata:
-            Optional dict with contextual info (channel, guild, user_id,
+            Optional mapping with contextual info (channel, guild, user_id,
             timestamp, duration_ms).  Passed verbatim into the user message.
         temperature:
             Sampling temperature.  Lower = more deterministic.  Default 0.2
             keeps JSON output consistent.
         max_completion_tokens:
-            Maximum tokens for the model response.  Default 1024 covers all
-            output sections with room to spare.
+            Maximum tokens for the model response.  ``None`` (default) sizes
+            it adaptively: 512 at first, then 1.5× the moving average of
+            observed completion lengths, capped at 1024.
 
         Returns
         -------
@@ -168,71 +375,119 @@ class CerebrusClient:
         RuntimeError
             When all keys have been exhausted without a successful response.
         ValueError
-            When the model returns a response that cannot be parsed as JSON.
+            When the model returns a response that cannot be parsed as JSON,
+            or one still cut off at ``MAX_COMPLETION_TOKENS``.
         """
-        if self._client_iter is None:
+        if self._rotation is None:
             raise RuntimeError(
                 "CerebrusClient has not been initialised. Call init() first."
             )
 
-        user_message = build_user_message(transcript, metadata)
-        max_attempts = len(self._clients) * 2
-        last_error: Exception | None = None
-
-        for attempt in range(1, max_attempts + 1):
-            client = self._next_client()
+        # Static system message first, so every request shares its prefix
+        messages = build_messages(
+            transcript, metadata, compress=self._compress_transcript
+        )
+        user_message = messages[-1]["content"]
 
-            logger.debug(
-                "[CerebrusClient] process attempt %d/%d — model=%s",
-                attempt,
-                max_attempts,
-                self._model,
+        cache_key: str | None = None
+        if self._cache_enabled(temperature):
+            cache_key = self._cache_key(
+                user_message, temperature, max_completion_tokens
             )
+            cached = await self._cache_get(cache_key)
+            if cached is not None:
+                logger.info("[CerebrusClient] Cache hit — model=%s", self._model)
+                return cached
 
-            try:
-                response = await client.chat.completions.create(
-                    model=self._model,
-                    messages=[
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": user_message},
-                    ],
-                    temperature=temperature,
-                    max_completion_tokens=max_completion_tokens,
-                    top_p=1,
-                    stream=False,
-                )
+        # The cache key above uses the caller's value, so adaptive sizing
+        # does not split otherwise identical prompts across cache entries.
+        if max_completion_tokens is None:
+            max_completion_tokens = self._completion_budget()
 
-                raw_text: str = response.choices[0].message.content or ""
+        max_attempts = len(self._clients) * 2
+        lanes = min(self._race_factor, len(self._clients))
+        attempt = 0
+        last_error: Exception | None = None
 
-                try:
-                    result: dict = json.loads(raw_text)
-                except json.JSONDecodeError as parse_err:
-                    logger.error(
-                        "[CerebrusClient] JSON parse error on attempt %d: %s\nRaw: %.300s",
+        while attempt < max_attempts:
+            width = 1 if attempt == 0 else min(lanes, max_attempts - attempt)
+            wave = []
+            for key_index in self._next_clients(width):
+                attempt += 1
+                wave.append(
+                    self._process_once(
+                        key_index,
+                        messages,
+                        temperature,
+                        max_completion_tokens,
                         attempt,
-                        parse_err,
-                        raw_text,
+                        max_attempts,
                     )
-                    raise ValueError(
-                        f"Model returned non-JSON response: {raw_text[:200]}"
-                    ) from parse_err
-
-                logger.info(
-                    "[CerebrusClient] Process successful — model=%s, "
-                    "topics=%d, actions=%d",
-                    self._model,
-                    len(result.get("key_topics", [])),
-                    len(result.get("action_items", [])),
                 )
-                return result
+
+            try:
+                result = await first_success(wave, RETRYABLE_ERRORS)
+            except RETRYABLE_ERRORS as exc:
+                last_error = exc
+                if attempt < max_attempts:
+                    await asyncio.sleep(_backoff_delay(attempt))
+                continue
+
+            if cache_key is not None:
+                await self._cache_put(cache_key, result)
+            return result
+
+        raise RuntimeError(
+            f"All {max_attempts} Cerebras attempt(s) failed. "
+            f"Last error: {last_error}"
+        )
+
+    async def _process_once(
+        self,
+        key_index: int,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_completion_tokens: int,
+        attempt: int,
+        max_attempts: int,
+    ) -> dict:
+        """Run a single completion request; API errors are logged and re-raised."""
+        logger.debug(
+            "[CerebrusClient] process attempt %d/%d — model=%s",
+            attempt,
+            max_attempts,
+            self._model,
+        )
+        client = self._clients[key_index]
+        # A reply cut off at the budget is not valid JSON, so retry it once
+        # on the same key with the full budget before giving up.
+        budgets = [max_completion_tokens]
+        if max_completion_tokens < MAX_COMPLETION_TOKENS:
+            budgets.append(MAX_COMPLETION_TOKENS)
+
+        for budget in budgets:
+            try:
+                async with self._limiter.slot():
+                    response = await client.chat.completions.create(
+                        model=self._model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_completion_tokens=budget,
+                        top_p=1,
+                        stream=False,
+                    )
 
             except RateLimitError as exc:
+                cooldown = self._rotation.cool_down(key_index, exc)
                 logger.warning(
-                    "[CerebrusClient] Rate limit (attempt %d): %s — rotating key…",
+                    "[CerebrusClient] Rate limit (attempt %d): %s — "
+                    "key %d cooling down %.1fs, rotating key…",
                     attempt,
                     exc,
+                    key_index,
+                    cooldown,
                 )
-                last_error = exc
+                raise
 
             except APIStatusError as exc:
                 logger.warning(
@@ -240,7 +495,7 @@ class CerebrusClient:
                     attempt,
                     exc,
                 )
-                last_error = exc
+                raise
 
             except APIConnectionError as exc:
                 logger.warning(
@@ -248,12 +503,50 @@ class CerebrusClient:
                     attempt,
                     exc,
                 )
-                last_error = exc
+                raise
+
+            truncated = response.choices[0].finish_reason == "length"
+            usage = response.usage
+            if usage is not None:
+                # A truncated count only says the budget was too small
+                if usage.completion_tokens and not truncated:
+                    self._record_completion_tokens(usage.completion_tokens)
+                if usage.prompt_tokens_details is not None:
+                    self._stats["cached_prompt_tokens"] += (
+                        usage.prompt_tokens_details.cached_tokens or 0
+                    )
+            if not truncated:
+                break
+            logger.warning(
+                "[CerebrusClient] Reply truncated at %d tokens (attempt %d)",
+                budget,
+                attempt,
+            )
+        else:
+            raise ValueError(f"Model reply exceeded {budgets[-1]} completion tokens.")
 
-        raise RuntimeError(
-            f"All {max_attempts} Cerebras attempt(s) failed. "
-            f"Last error: {last_error}"
+        raw_text: str = response.choices[0].message.content or ""
+
+        try:
+            result: dict = orjson.loads(raw_text)
+        except orjson.JSONDecodeError as parse_err:
+            logger.error(
+                "[CerebrusClient] JSON parse error on attempt %d: %s\nRaw: %.300s",
+                attempt,
+                parse_err,
+                raw_text,
+            )
+            raise ValueError(
+                f"Model returned non-JSON response: {raw_text[:200]}"
+            ) from parse_err
+
+        logger.info(
+            "[CerebrusClient] Process successful — model=%s, topics=%d, actions=%d",
+            self._model,
+            len(result.get("key_topics", [])),
+            len(result.get("action_items", [])),
         )
+        return result
 
 
 # ---------------------------------------------------------------------------
@@ -5,20 +5,33 @@ Whisper-model selection with transparent retry logic.
 Lifecycle
 ---------
 Call ``groq_client.init()`` once at server startup (inside FastAPI lifespan).
-Call ``groq_client.close()`` once at server shutdown.
-Then call ``await groq_client.transcribe(audio_bytes, filename)`` from any
+Call ``await groq_client.close()`` once at server shutdown.
+Then call ``await groq_client.transcribe(audio_path, filename)`` from any
 request handler.
 """
 
 from __future__ import annotations
 
-import io
+import asyncio
+import contextlib
 import itertools
 import logging
 import os
-from typing import Iterator
-
-from groq import AsyncGroq, APIConnectionError, APIStatusError, RateLimitError
+import random
+from typing import BinaryIO, Iterator
+
+import httpx
+from groq import (
+    AsyncGroq,
+    APIConnectionError,
+    APIStatusError,
+    DefaultAsyncHttpxClient,
+    RateLimitError,
+)
+
+from adaptive_limiter import AdaptiveLimiter
+from key_rotation import KeyRotation
+from race import first_success
 
 logger = logging.getLogger(__name__)
 
@@ -31,19 +44,70 @@ DEFAULT_WHISPER_MODELS: list[str] = [
     "whisper-large-v3",  # highest accuracy, slower
 ]
 
+# ---------------------------------------------------------------------------
+# Connection pool shared by every per-key AsyncGroq instance
+# ---------------------------------------------------------------------------
+HTTP_LIMITS: httpx.Limits = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=50,
+)
+
+# ---------------------------------------------------------------------------
+# Retry fan-out — how many keys a retry wave races in parallel.
+# Override via GROQ_RACE_FACTOR env var (1 = plain sequential rotation).
+# ---------------------------------------------------------------------------
+DEFAULT_RACE_FACTOR: int = 2
+
+# ---------------------------------------------------------------------------
+# Adaptive concurrency — AIMD limit on in-flight requests, halved on 429s.
+# Override via GROQ_INITIAL_CONCURRENCY / GROQ_MAX_CONCURRENCY env vars.
+# ---------------------------------------------------------------------------
+DEFAULT_INITIAL_CONCURRENCY: int = 4
+DEFAULT_MAX_CONCURRENCY: int = 32
+
+# ---------------------------------------------------------------------------
+# Exponential backoff with jitter between retry waves
+# ---------------------------------------------------------------------------
+BACKOFF_BASE_SECONDS: float = 0.1
+BACKOFF_MAX_SECONDS: float = 5.0
+BACKOFF_JITTER_SECONDS: float = 0.1
+
+# Errors that rotate to the next key+model instead of failing the call
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    RateLimitError,
+    APIStatusError,
+    APIConnectionError,
+)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Seconds to wait before the next retry wave: capped exponential + jitter."""
+    return min(BACKOFF_BASE_SECONDS * 2**attempt, BACKOFF_MAX_SECONDS) + (
+        random.random() * BACKOFF_JITTER_SECONDS
+    )
+
 
 class GroqClient:
     """
     Singleton-style client that manages a pool of Groq API keys and a list
-    of Whisper model names.  Both are cycled round-robin; on any
-    rate-limit / API error the next key+model pair is tried automatically.
+    of Whisper model names.  All keys share one ``httpx.AsyncClient``
+    connection pool.  Keys and models are cycled round-robin; on any
+    rate-limit / API error the next key+model pair is tried automatically,
+    and a rate-limited key is skipped until its Retry-After has elapsed.
     """
 
     def __init__(self) -> None:
+        self._http: httpx.AsyncClient | None = None
         self._clients: list[AsyncGroq] = []
         self._models: list[str] = []
-        self._client_iter: Iterator[AsyncGroq] | None = None
+        self._rotation: KeyRotation | None = None
         self._model_iter: Iterator[str] | None = None
+        self._race_factor: int = DEFAULT_RACE_FACTOR
+        self._limiter = AdaptiveLimiter(
+            DEFAULT_INITIAL_CONCURRENCY,
+            DEFAULT_MAX_CONCURRENCY,
+            overload=(RateLimitError,),
+        )
 
     # ------------------------------------------------------------------
     # Lifecycle helpers
@@ -60,6 +124,9 @@ class GroqClient:
         GROQ_API_KEYS       – comma-separated list of Groq API keys (optional)
         GROQ_WHISPER_MODELS – comma-separated list of Whisper model IDs to use
                               (defaults to DEFAULT_WHISPER_MODELS)
+        GROQ_RACE_FACTOR    – keys raced in parallel per retry wave (default: 2)
+        GROQ_INITIAL_CONCURRENCY / GROQ_MAX_CONCURRENCY
+                            – adaptive in-flight request limit (default: 4 / 32)
 
         At least one key must be present.
         """
@@ -70,24 +137,48 @@ class GroqClient:
                 "Set GROQ_API_KEY and/or GROQ_API_KEYS in your environment."
             )
 
-        self._clients = [AsyncGroq(api_key=key) for key in api_keys]
-        self._client_iter = itertools.cycle(self._clients)
+        # One keep-alive pool for all keys; auth headers are set per request
+        self._http = DefaultAsyncHttpxClient(limits=HTTP_LIMITS)
+        self._clients = [
+            AsyncGroq(api_key=key, http_client=self._http) for key in api_keys
+        ]
+        self._rotation = KeyRotation(len(self._clients))
 
         self._models = self._load_models()
         self._model_iter = itertools.cycle(self._models)
 
+        self._race_factor = max(
+            1, int(os.getenv("GROQ_RACE_FACTOR", DEFAULT_RACE_FACTOR))
+        )
+        self._limiter = AdaptiveLimiter(
+            int(os.getenv("GROQ_INITIAL_CONCURRENCY", DEFAULT_INITIAL_CONCURRENCY)),
+            int(os.getenv("GROQ_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            overload=(RateLimitError,),
+        )
+
         logger.info(
-            "[GroqClient] Initialised — %d key(s), %d model(s): %s",
+            "[GroqClient] Initialised — %d key(s), %d model(s): %s, race=%d",
             len(self._clients),
             len(self._models),
             self._models,
+            self._race_factor,
         )
 
-    def close(self) -> None:
-        """Release all resources and reset internal state."""
+    async def close(self) -> None:
+        """Close every ``AsyncGroq`` client and the shared pool, then reset state."""
+        results = await asyncio.gather(
+            *(client.close() for client in self._clients),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("[GroqClient] Error closing client: %s", result)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
         self._clients.clear()
         self._models.clear()
-        self._client_iter = None
+        self._rotation = None
         self._model_iter = None
         logger.info("[GroqClient] Shut down cleanly.")
 
@@ -103,19 +194,12 @@ class GroqClient:
           2. ``GROQ_API_KEYS`` (comma-separated list)
         Duplicates are removed while preserving order.
         """
-        seen: set[str] = set()
-        keys: list[str] = []
-
-        for raw in [
+        parts = [
             os.getenv("GROQ_API_KEY", ""),
             *os.getenv("GROQ_API_KEYS", "").split(","),
-        ]:
-            key = raw.strip()
-            if key and key not in seen:
-                seen.add(key)
-                keys.append(key)
-
-        return keys
+        ]
+        # dict.fromkeys de-duplicates in one pass and keeps first-seen order
+        return list(dict.fromkeys(key for raw in parts if (key := raw.strip())))
 
     @staticmethod
     def _load_models() -> list[str]:
@@ -130,12 +214,16 @@ class GroqClient:
                 return models
         return list(DEFAULT_WHISPER_MODELS)
 
-    def _next_client(self) -> AsyncGroq:
-        if self._client_iter is None:
+    def _next_clients(self, count: int) -> list[int]:
+        """
+        Up to *count* distinct key indices for one wave, skipping keys in
+        rate-limit cooldown.
+        """
+        if self._rotation is None:
             raise RuntimeError(
                 "GroqClient has not been initialised. Call init() first."
             )
-        return next(self._client_iter)
+        return self._rotation.next_indices(count)
 
     def _next_model(self) -> str:
         if self._model_iter is None:
@@ -150,22 +238,27 @@ class GroqClient:
 
     async def transcribe(
         self,
-        audio_bytes: bytes,
-        filename: str = "audio.wav",
+        audio_path: str | os.PathLike[str],
+        filename: str | None = None,
         language: str | None = None,
     ) -> str:
         """
-        Transcribe *audio_bytes* (WAV/MP3/…) using the Groq Whisper API.
+        Transcribe the audio file at *audio_path* (WAV/MP3/…) using the Groq
+        Whisper API.  The file is streamed from disk by the HTTP client rather
+        than loaded into memory.
 
         The method rotates through every (client, model) pair before giving up,
         so transient rate-limit errors on one key or model are handled silently.
+        The first attempt is a single request; once it fails, each retry wave
+        races up to ``GROQ_RACE_FACTOR`` keys and keeps the first success.
 
         Parameters
         ----------
-        audio_bytes:
-            Raw audio data.
+        audio_path:
+            Path to the audio file on disk.
         filename:
             Hint used by Groq to detect the audio format (e.g. ``"clip.wav"``).
+            Defaults to the basename of *audio_path*.
         language:
             BCP-47 language code (e.g. ``"en"``).  ``None`` lets Whisper
             auto-detect.
@@ -180,75 +273,124 @@ class GroqClient:
         RuntimeError
             When all key+model combinations have been exhausted without success.
         """
-        if self._client_iter is None or self._model_iter is None:
+        if self._rotation is None or self._model_iter is None:
             raise RuntimeError(
                 "GroqClient has not been initialised. Call init() first."
             )
 
+        if filename is None:
+            filename = os.path.basename(audio_path)
+
         # Maximum attempts = keys × models (full rotation of both dimensions)
         max_attempts = max(len(self._clients), len(self._models)) * 2
+        lanes = min(self._race_factor, len(self._clients))
+        attempt = 0
         last_error: Exception | None = None
 
-        for attempt in range(1, max_attempts + 1):
-            client = self._next_client()
-            model = self._next_model()
+        with contextlib.ExitStack() as stack:
+            # One handle per parallel lane, rewound instead of reopened on retry
+            audio_files = [
+                stack.enter_context(open(audio_path, "rb")) for _ in range(lanes)
+            ]
+
+            while attempt < max_attempts:
+                width = 1 if attempt == 0 else min(lanes, max_attempts - attempt)
+                wave = []
+                for lane, key_index in enumerate(self._next_clients(width)):
+                    attempt += 1
+                    wave.append(
+                        self._transcribe_once(
+                            key_index,
+                            self._next_model(),
+                            audio_files[lane],
+                            filename,
+                            language,
+                            attempt,
+                            max_attempts,
+                        )
+                    )
+
+                try:
+                    return await first_success(wave, RETRYABLE_ERRORS)
+                except RETRYABLE_ERRORS as exc:
+                    last_error = exc
+
+                if attempt < max_attempts:
+                    await asyncio.sleep(_backoff_delay(attempt))
 
-            logger.debug(
-                "[GroqClient] transcribe attempt %d/%d — model=%s",
-                attempt,
-                max_attempts,
-                model,
-            )
+        raise RuntimeError(
+            f"All {max_attempts} transcription attempt(s) failed. "
+            f"Last error: {last_error}"
+        )
+
+    async def _transcribe_once(
+        self,
+        key_index: int,
+        model: str,
+        audio_file: BinaryIO,
+        filename: str,
+        language: str | None,
+        attempt: int,
+        max_attempts: int,
+    ) -> str:
+        """Run a single transcription request; API errors are logged and re-raised."""
+        logger.debug(
+            "[GroqClient] transcribe attempt %d/%d — model=%s",
+            attempt,
+            max_attempts,
+            model,
+        )
+        client = self._clients[key_index]
 
-            try:
+        try:
+            async with self._limiter.slot():
+                audio_file.seek(0)
                 response = await client.audio.transcriptions.create(
-                    file=(filename, io.BytesIO(audio_bytes), "audio/wav"),
+                    file=(filename, audio_file, "audio/wav"),
                     model=model,
                     language=language,
                     response_format="text",
                 )
-                # response_format="text" returns a plain string
-                transcript: str = (
-                    response if isinstance(response, str) else response.text
-                )
-                logger.info(
-                    "[GroqClient] Transcription successful — model=%s, chars=%d",
-                    model,
-                    len(transcript),
-                )
-                return transcript
-
-            except RateLimitError as exc:
-                logger.warning(
-                    "[GroqClient] Rate limit on model=%s (attempt %d): %s — rotating…",
-                    model,
-                    attempt,
-                    exc,
-                )
-                last_error = exc
-
-            except APIStatusError as exc:
-                logger.warning(
-                    "[GroqClient] API status error on model=%s (attempt %d): %s — rotating…",
-                    model,
-                    attempt,
-                    exc,
-                )
-                last_error = exc
-
-            except APIConnectionError as exc:
-                logger.warning(
-                    "[GroqClient] Connection error on model=%s (attempt %d): %s — rotating…",
-                    model,
-                    attempt,
-                    exc,
-                )
-                last_error = exc
 
-        raise RuntimeError(
-            f"All {max_attempts} transcription attempt(s) failed. "
-            f"Last error: {last_error}"
+        except RateLimitError as exc:
+            cooldown = self._rotation.cool_down(key_index, exc)
+            logger.warning(
+                "[GroqClient] Rate limit on model=%s (attempt %d): %s — "
+                "key %d cooling down %.1fs, rotating…",
+                model,
+                attempt,
+                exc,
+                key_index,
+                cooldown,
+            )
+            raise
+
+        except APIStatusError as exc:
+            logger.warning(
+                "[GroqClient] API status error on model=%s (attempt %d): %s — rotating…",
+                model,
+                attempt,
+                exc,
+            )
+            raise
+
+        except APIConnectionError as exc:
+            logger.warning(
+                "[GroqClient] Connection error on model=%s (attempt %d): %s — rotating…",
+                model,
+                attempt,
+                exc,
+            )
+            raise
+
+        # response_format="text" returns a plain string
+        transcript: str = response if isinstance(response, str) else response.text
+        logger.info(
+            "[GroqClient] Transcription successful — model=%s, chars=%d",
+            model,
+            len(transcript),
         )
+        return transcript
 
 
 # ---------------------------------------------------------------------------
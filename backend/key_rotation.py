@@ -0,0 +1,101 @@
+"""
+key_rotation.py
+───────────────
+Round-robin API-key rotation that skips keys which are cooling down after a
+rate limit.
+
+Used by ``GroqClient`` and ``CerebrusClient`` in place of ``itertools.cycle``
+so that, during a partial outage, requests go to keys that can actually
+serve them instead of walking into a guaranteed 429.
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# ---------------------------------------------------------------------------
+# Cooldown applied when a 429 carries no usable Retry-After header
+# ---------------------------------------------------------------------------
+DEFAULT_COOLDOWN_SECONDS: float = 5.0
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """
+    Extract the server-requested wait from an SDK ``APIStatusError``.
+
+    Understands ``retry-after-ms`` and ``retry-after`` (delta-seconds or an
+    HTTP date).  Returns ``None`` when the error has no such header.
+    """
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    raw_ms = headers.get("retry-after-ms")
+    if raw_ms:
+        try:
+            return max(0.0, float(raw_ms) / 1000)
+        except ValueError:
+            pass
+
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(raw)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class KeyRotation:
+    """
+    Index-based round-robin over ``size`` keys with per-key cooldowns.
+
+    ``next_indices(count)`` returns up to *count* distinct keys that are not
+    cooling down, so a retry wave never sends the same request to one key
+    twice; the wave narrows when fewer keys are free.  When every key is
+    cooling down it returns only the one that becomes available first
+    rather than blocking.
+    """
+
+    def __init__(self, size: int) -> None:
+        if size < 1:
+            raise ValueError("KeyRotation needs at least one key.")
+        self._size = size
+        self._idx = -1
+        self._cooldown_until: list[float] = [0.0] * size
+
+    def next_indices(self, count: int) -> list[int]:
+        now = time.monotonic()
+        chosen: list[int] = []
+        # One pass over the ring visits each key at most once
+        for _ in range(self._size):
+            if len(chosen) >= count:
+                break
+            self._idx = (self._idx + 1) % self._size
+            if self._cooldown_until[self._idx] <= now:
+                chosen.append(self._idx)
+        if chosen:
+            return chosen
+
+        self._idx = min(range(self._size), key=self._cooldown_until.__getitem__)
+        return [self._idx]
+
+    def cool_down(self, index: int, exc: BaseException) -> float:
+        """
+        Bench key *index* for the wait requested by *exc* (or the default
+        cooldown) and return that wait in seconds.
+        """
+        delay = retry_after_seconds(exc)
+        if delay is None:
+            delay = DEFAULT_COOLDOWN_SECONDS
+        until = time.monotonic() + delay
+        self._cooldown_until[index] = max(self._cooldown_until[index], until)
+        return delay
@@ -21,11 +21,26 @@ Total (incl. transcript)          ~800–2 800
 Remaining headroom for long calls    ~125 000+
 """
 
+import functools
+import json
+import logging
+import re
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping
+
+import orjson
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
 # ---------------------------------------------------------------------------
 # System prompt — instructs the model on role, output format, and token
 # targets so that responses stay predictable regardless of transcript length.
+#
+# SYSTEM_PROMPT_VERBOSE is the human-readable source of truth for review;
+# SYSTEM_PROMPT (= SYSTEM_PROMPT_COMPACT, below) is what gets sent.
 # ---------------------------------------------------------------------------
-SYSTEM_PROMPT: str = """\
+SYSTEM_PROMPT_VERBOSE: str = """\
 You are a highly accurate meeting-intelligence assistant embedded in a \
 Discord voice-channel recording system.
 
@@ -77,6 +92,223 @@ fences or any text outside the JSON):
    user's metadata specifies otherwise.
 """
 
+# ---------------------------------------------------------------------------
+# Compact system prompt — derived from SYSTEM_PROMPT_VERBOSE once at import so
+# every request carries fewer prefix tokens.  The guidance table is replaced
+# by SECTION_SPEC rendered as terse bullets (or, optionally, minified JSON):
+# the same targets without the pipes and padding that a BPE tokenizer splits
+# into many tokens.
+# ---------------------------------------------------------------------------
+SECTION_SPEC: dict[str, dict[str, str | int]] = {
+    "summary": {
+        "count": "2–4 sentences",
+        "tokens": 120,
+        "note": "high-level TL;DR of whole conversation",
+    },
+    "key_topics": {
+        "count": "3–8",
+        "tokens": 200,
+        "note": "noun phrases, ≤ 8 words each; main themes",
+    },
+    "action_items": {
+        "count": "0–N",
+        "tokens": 200,
+        "note": "owner: person name or null; task: clear description",
+    },
+    "decisions": {
+        "count": "0–N",
+        "tokens": 120,
+        "note": "firm, concrete conclusions only",
+    },
+    "open_questions": {
+        "count": "0–N",
+        "tokens": 120,
+        "note": "unresolved questions or items needing follow-up",
+    },
+    "sentiment": {
+        "count": "1 label",
+        "tokens": 80,
+        "note": "overall emotional tone",
+    },
+}
+
+
+def _render_section_guidance(style: str) -> str:
+    """Render SECTION_SPEC as ``"bullets"`` (one line per field) or ``"json"``."""
+    if style == "json":
+        return json.dumps(SECTION_SPEC, separators=(",", ":"), ensure_ascii=False)
+    if style == "bullets":
+        return "\n".join(
+            f"- {field}: {spec['count']} (~{spec['tokens']} t); {spec['note']}"
+            for field, spec in SECTION_SPEC.items()
+        )
+    raise ValueError(f"Unknown section guidance style: {style!r}")
+
+
+_TABLE_RE = re.compile(r"(?:^\|.*\|\n)+", re.MULTILINE)
+_ARTICLE_RE = re.compile(r"\b(?:a|an|the) ", re.IGNORECASE)
+_SPACES_RE = re.compile(r"[ \t]+")
+_LINE_EDGE_RE = re.compile(r" ?\n ?")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+# Lines that start their own line: headings, table rows, list items
+_BLOCK_LINE_RE = re.compile(r"#|\||[-*] |\d+\. ")
+
+
+def _pack(text: str) -> str:
+    """
+    Join soft-wrapped lines within each paragraph onto one line.
+
+    Headings, table rows and list items keep their own lines (a wrapped list
+    item is joined onto its item), and paragraphs containing fenced code are
+    left untouched.
+    """
+    paragraphs = []
+    for para in text.split("\n\n"):
+        if "```" in para:
+            paragraphs.append(para)
+            continue
+        lines: list[str] = []
+        for line in para.split("\n"):
+            if (
+                lines
+                and line
+                and not _BLOCK_LINE_RE.match(line)
+                and not lines[-1].startswith(("#", "|"))
+            ):
+                lines[-1] += " " + line
+            else:
+                lines.append(line)
+        paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+
+def _compress_system_prompt(prompt: str, guidance: str = "bullets") -> str:
+    """
+    Return a token-lean rendering of *prompt* with the same instructions.
+
+    Articles are dropped, runs of spaces and blank lines are collapsed,
+    soft-wrapped lines are packed, and the markdown guidance table becomes
+    ``SECTION_SPEC`` rendered in the *guidance* style (``"bullets"`` or
+    ``"json"``).
+    """
+    rendered = _render_section_guidance(guidance)
+    prompt = _ARTICLE_RE.sub("", prompt)
+    prompt = _SPACES_RE.sub(" ", prompt)
+    prompt = _LINE_EDGE_RE.sub("\n", prompt)
+    prompt = _pack(prompt)
+    prompt = _TABLE_RE.sub(lambda _: rendered + "\n", prompt, count=1)
+    return _BLANK_LINES_RE.sub("\n\n", prompt).strip() + "\n"
+
+
+SYSTEM_PROMPT_COMPACT: str = _compress_system_prompt(SYSTEM_PROMPT_VERBOSE)
+SYSTEM_PROMPT: str = SYSTEM_PROMPT_COMPACT
+
+# Pre-encoded forms for callers that assemble request bodies themselves: the
+# UTF-8 bytes, and the JSON string escape (without the outer quotes) ready to
+# splice into a body between two '"'.
+SYSTEM_PROMPT_BYTES: bytes = SYSTEM_PROMPT.encode("utf-8")
+SYSTEM_PROMPT_JSON_ENCODED: str = json.dumps(SYSTEM_PROMPT, ensure_ascii=False)[1:-1]
+
+# Static chat prefix shared by every request.  Providers cache prompts by
+# exact prefix, so this must stay byte-identical: never mutate it or put
+# per-request data (timestamps, IDs, metadata) into the system block —
+# anything dynamic belongs in the user message.
+SYSTEM_MESSAGE: dict[str, str] = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Chat-completions body pieces for build_request_body(); everything static,
+# including the escaped system prompt, is encoded here once.
+_BODY_HEAD: bytes = b'{"model":'
+_BODY_MESSAGES: bytes = (
+    b',"messages":[{"role":"system","content":"'
+    + SYSTEM_PROMPT_JSON_ENCODED.encode("utf-8")
+    + b'"},{"role":"user","content":'
+)
+_BODY_MESSAGES_END: bytes = b"}]"
+
+# ---------------------------------------------------------------------------
+# Token counting — o200k_base is the tokenizer family of the GPT-OSS models.
+# tiktoken downloads the BPE file (with no timeout) unless it is already in
+# TIKTOKEN_CACHE_DIR, so counting never loads it: the server warms it with
+# load_encoding() in a worker thread at startup.  Until it is loaded, counts
+# fall back to a characters-per-token estimate.
+# ---------------------------------------------------------------------------
+_FALLBACK_CHARS_PER_TOKEN: int = 4
+
+# Completion tokens build_user_message_budgeted() leaves room for by default
+# (CerebrusClient caps completions at 1024).
+DEFAULT_OUTPUT_RESERVE_TOKENS: int = 1024
+
+
+_ENC: tiktoken.Encoding | None = None
+
+
+def load_encoding() -> bool:
+    """
+    Load the o200k_base encoding unless it is already loaded, and return
+    whether it is available.
+
+    Blocks, possibly on a download, so call it off the event loop.  A
+    failure is not remembered; the next call tries again.
+    """
+    global _ENC
+    if _ENC is not None:
+        return True
+    try:
+        _ENC = tiktoken.get_encoding("o200k_base")
+    except Exception as exc:
+        logger.warning(
+            "[PromptTemplate] tiktoken encoding unavailable (%s) — estimating "
+            "token counts from length",
+            exc,
+        )
+        return False
+    # Drop any count estimated before the encoding arrived
+    system_prompt_tokens.cache_clear()
+    _check_compact_saving()
+    return True
+
+
+def count_tokens(text: str) -> int:
+    """
+    Number of o200k_base tokens in *text*; estimated from its length until
+    ``load_encoding()`` has succeeded.
+    """
+    if _ENC is None:
+        return -(-len(text) // _FALLBACK_CHARS_PER_TOKEN)
+    return len(_ENC.encode(text, disallowed_special=()))
+
+
+# The compact prompt should cost under 70% of the readable one (o200k_base:
+# 352 vs 505 tokens).  Checked with real counts as soon as load_encoding()
+# succeeds, i.e. at server startup, so an edit to SYSTEM_PROMPT_VERBOSE that
+# erodes the saving shows up in the log rather than failing the import.
+COMPACT_PROMPT_TARGET_RATIO: float = 0.7
+
+
+@functools.lru_cache(maxsize=1)
+def system_prompt_tokens() -> int:
+    """
+    Number of tokens in ``SYSTEM_PROMPT``, counted once (and again after
+    ``load_encoding()`` succeeds).
+    """
+    return count_tokens(SYSTEM_PROMPT_COMPACT)
+
+
+def _check_compact_saving() -> None:
+    tokens = system_prompt_tokens()
+    verbose_tokens = count_tokens(SYSTEM_PROMPT_VERBOSE)
+    ratio = tokens / verbose_tokens
+    logger.log(
+        logging.WARNING if ratio >= COMPACT_PROMPT_TARGET_RATIO else logging.INFO,
+        "[PromptTemplate] Compact system prompt is %d tokens, %.1f%% of the "
+        "verbose prompt's %d (target under %.0f%%)",
+        tokens,
+        100 * ratio,
+        verbose_tokens,
+        100 * COMPACT_PROMPT_TARGET_RATIO,
+    )
+
+
 # ---------------------------------------------------------------------------
 # User message template — {transcript} is replaced at runtime.
 # Optional {metadata} slot accepts a JSON string of extra context
@@ -92,24 +324,125 @@ USER_TEMPLATE: str = """\
 Analyse the transcript above and return the JSON report.\
 """
 
+# Split once at import so each call is a single join instead of a format()
+# that re-parses the template.
+_BEFORE_META, _AFTER_META = USER_TEMPLATE.split("{metadata_block}", 1)
+_MIDDLE, _END = _AFTER_META.split("{transcript}", 1)
+_BEFORE_META_BYTES: bytes = _BEFORE_META.encode("utf-8")
+_MIDDLE_BYTES: bytes = _MIDDLE.encode("utf-8")
+_END_BYTES: bytes = _END.encode("utf-8")
+
+# Recognised metadata keys and their labels, in the order they are rendered.
+# A fixed order keeps the metadata block byte-identical for the same values
+# however the caller happened to build the dict.
+_LABEL_ITEMS: tuple[tuple[str, str], ...] = (
+    ("channel", "Channel"),
+    ("guild", "Server"),
+    ("user_id", "User ID"),
+    ("timestamp", "Recorded at"),
+    ("duration_ms", "Duration (ms)"),
+)
+_LABEL_MAP: dict[str, str] = dict(_LABEL_ITEMS)
+_META_HEADER: str = "## Recording metadata\n\n"
+
+# Built messages memoised by build_user_message(); retries and repeat
+# requests for the same clip skip the rebuild.
+BUILD_CACHE_SIZE: int = 256
+
+# Shared read-only default for the builders' metadata argument
+_EMPTY_METADATA: Mapping[str, Any] = MappingProxyType({})
+
+
+@functools.lru_cache(maxsize=256)
+def _fallback_label(key: str) -> str:
+    """Title-case label for a metadata key without an entry in _LABEL_MAP."""
+    return key.replace("_", " ").title()
+
+
+# ---------------------------------------------------------------------------
+# Transcript compaction — optional, drops tokens that carry no content.
+# Only pure disfluencies count as fillers; words like "like" or "you know"
+# often carry meaning and are left alone.
+# ---------------------------------------------------------------------------
+_KEEP_RE = re.compile(r"<keep>(.*?)</keep>", re.DOTALL)
+_SPEAKER_TAG_RE = re.compile(r"\[Speaker \d+\]:\s*")
+# Lower-case or sentence-initial only: "HMM", "ER", "UM" are acronyms and
+# "er"/"err" are too often real words to drop
+_FILLER_RE = re.compile(r"\b(?:[Uu]h+|[Uu]m+|[Ee]rm+|[Hh]mm+)\b[,.]?\s*")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def compress_transcript(transcript: str) -> str:
+    """
+    Remove speaker tags and filler sounds from *transcript* and collapse
+    whitespace.  Text wrapped in ``<keep>...</keep>`` is passed through
+    verbatim (without the tags).
+    """
+    # Even indices are outside <keep> spans, odd indices are their contents
+    parts = _KEEP_RE.split(transcript)
+    for i in range(0, len(parts), 2):
+        part = _SPEAKER_TAG_RE.sub("", parts[i])
+        part = _FILLER_RE.sub("", part)
+        parts[i] = _WHITESPACE_RE.sub(" ", part)
+    return "".join(parts).strip()
+
+
 # ---------------------------------------------------------------------------
-# Helper — build the filled-in user message
+# Helpers — build the filled-in user message
 # ---------------------------------------------------------------------------
 
 
+def _metadata_block(metadata: Mapping[str, Any] | None) -> str:
+    if not metadata:
+        return ""
+    # One row per key, so the list can be sized up front and filled in place
+    rows: list[str] = [""] * len(metadata)
+    i = 0
+    for key, label in _LABEL_ITEMS:
+        if key in metadata:
+            rows[i] = f"- **{label}**: {metadata[key]}"
+            i += 1
+    for key, value in metadata.items():
+        if key not in _LABEL_MAP:
+            rows[i] = f"- **{_fallback_label(key)}**: {value}"
+            i += 1
+    return _META_HEADER + "\n".join(rows) + "\n\n"
+
+
+def _build(
+    transcript: str, metadata: Mapping[str, Any] | None, pre_stripped: bool
+) -> str:
+    if not pre_stripped:
+        transcript = transcript.strip()
+    return "".join((_BEFORE_META, _metadata_block(metadata), _MIDDLE, transcript, _END))
+
+
+@functools.lru_cache(maxsize=BUILD_CACHE_SIZE)
+def _build_cached(transcript: str, metadata_items: tuple, pre_stripped: bool) -> str:
+    return _build(transcript, {k: v for k, _, v in metadata_items}, pre_stripped)
+
+
 def build_user_message(
     transcript: str,
-    metadata: dict | None = None,
+    metadata: Mapping[str, Any] | None = _EMPTY_METADATA,
+    *,
+    pre_stripped: bool = False,
+    compress: bool = False,
 ) -> str:
     """
     Construct the user message string from the template.
 
+    Results are memoised (up to ``BUILD_CACHE_SIZE`` entries) when every
+    metadata value is hashable; ``build_user_message.cache_clear()`` empties
+    the memo.
+
     Parameters
     ----------
     transcript:
         Raw text produced by the Whisper transcription step.
     metadata:
-        Optional dict of contextual information.  Recognised keys:
+        Optional mapping of contextual information (``None`` is accepted
+        as "no metadata").  Recognised keys:
 
         - ``channel``   – Discord voice channel name
         - ``guild``     – Discord server (guild) name
@@ -117,30 +450,208 @@ def build_user_message(
         - ``timestamp`` – ISO-8601 datetime string of the recording
         - ``duration_ms`` – clip duration in milliseconds
 
-        Unknown keys are included as-is.
+        Recognised keys are rendered in the order above; unknown keys
+        follow in the caller's order, labelled from the key name.
+    pre_stripped:
+        Set when *transcript* has no leading or trailing whitespace, to skip
+        the strip pass over it.
+    compress:
+        Run *transcript* through ``compress_transcript`` first.
 
     Returns
     -------
     str
         The formatted user message ready to send to the model.
     """
-    if metadata:
-        lines = ["## Recording metadata\n"]
-        label_map = {
-            "channel": "Channel",
-            "guild": "Server",
-            "user_id": "User ID",
-            "timestamp": "Recorded at",
-            "duration_ms": "Duration (ms)",
-        }
-        for key, value in metadata.items():
-            label = label_map.get(key, key.replace("_", " ").title())
-            lines.append(f"- **{label}**: {value}")
-        metadata_block = "\n".join(lines) + "\n\n"
+    if compress:
+        transcript = compress_transcript(transcript)
+        pre_stripped = True
+    # Equal values of different types (1, 1.0, True) render differently, so
+    # the type is part of the memo key
+    items = tuple((k, type(v), v) for k, v in metadata.items()) if metadata else ()
+    try:
+        return _build_cached(transcript, items, pre_stripped)
+    except TypeError:
+        # Unhashable metadata value — build without memoising
+        return _build(transcript, metadata, pre_stripped)
+
+
+build_user_message.cache_clear = _build_cached.cache_clear
+
+
+def _transcript_bytes(transcript: str | bytes | bytearray, pre_stripped: bool) -> bytes:
+    if isinstance(transcript, str):
+        if not pre_stripped:
+            transcript = transcript.strip()
+        return transcript.encode("utf-8")
+    # Already UTF-8: strip in the bytes domain instead of decoding
+    return bytes(transcript if pre_stripped else transcript.strip())
+
+
+def build_user_message_iter(
+    transcript: str | bytes | bytearray,
+    metadata: Mapping[str, Any] | None = _EMPTY_METADATA,
+    *,
+    pre_stripped: bool = False,
+) -> Iterator[bytes]:
+    """
+    Yield the same message as ``build_user_message`` as UTF-8 chunks.
+
+    The template pieces are encoded once at import; only the metadata block
+    and the transcript are encoded per call, and the full message is never
+    held as one ``str``.  Suitable as a streamed HTTP request body.  Empty
+    chunks are skipped.  *transcript* may already be UTF-8 ``bytes``; note
+    that ``bytes.strip()`` only trims ASCII whitespace.
+    """
+    for chunk in (
+        _BEFORE_META_BYTES,
+        _metadata_block(metadata).encode("utf-8"),
+        _MIDDLE_BYTES,
+        _transcript_bytes(transcript, pre_stripped),
+        _END_BYTES,
+    ):
+        if chunk:
+            yield chunk
+
+
+def build_user_message_bytes(
+    transcript: str | bytes | bytearray,
+    metadata: Mapping[str, Any] | None = _EMPTY_METADATA,
+    *,
+    pre_stripped: bool = False,
+) -> bytes:
+    """
+    Return the same message as ``build_user_message`` as UTF-8 ``bytes``.
+
+    A ``bytes``/``bytearray`` transcript (UTF-8) is joined as-is, skipping
+    the decode/encode round trip; only ASCII whitespace is stripped from it.
+    """
+    return b"".join(
+        build_user_message_iter(transcript, metadata, pre_stripped=pre_stripped)
+    )
+
+
+def build_messages(
+    transcript: str,
+    metadata: Mapping[str, Any] | None = _EMPTY_METADATA,
+    *,
+    pre_stripped: bool = False,
+    compress: bool = False,
+) -> list[dict[str, str]]:
+    """
+    Return the chat ``messages`` list for *transcript*.
+
+    The static ``SYSTEM_MESSAGE`` comes first, unchanged, so the
+    provider's prefix cache can reuse it; all per-request content is in the
+    trailing user message, built by ``build_user_message`` with the same
+    arguments.
+    """
+    return [
+        SYSTEM_MESSAGE,
+        {
+            "role": "user",
+            "content": build_user_message(
+                transcript, metadata, pre_stripped=pre_stripped, compress=compress
+            ),
+        },
+    ]
+
+
+def build_user_message_budgeted(
+    transcript: str,
+    metadata: Mapping[str, Any] | None = _EMPTY_METADATA,
+    *,
+    max_tokens: int,
+    output_reserve: int = DEFAULT_OUTPUT_RESERVE_TOKENS,
+) -> str:
+    """
+    Build the user message, truncating *transcript* so that the system
+    prompt, the message and *output_reserve* completion tokens fit within
+    *max_tokens*.
+
+    The transcript is tokenised once and cut on a token boundary that is
+    also a character boundary; without the tiktoken encoding it is cut by
+    the characters-per-token estimate.
+    Tokens can merge across the joins with the template, so the assembled
+    message is re-counted and the transcript trimmed further until it fits.
+
+    Raises
+    ------
+    ValueError
+        When the system prompt, metadata and reserve alone exceed
+        *max_tokens*.
+    """
+    transcript = transcript.strip()
+    scaffold = count_tokens(_build("", metadata, pre_stripped=True))
+    system = system_prompt_tokens()
+    budget = max_tokens - system - scaffold - output_reserve
+    if budget <= 0:
+        raise ValueError(
+            f"max_tokens={max_tokens} leaves no room for the transcript "
+            f"(system {system} + message {scaffold} + "
+            f"reserve {output_reserve} tokens)"
+        )
+
+    # Cut in characters when estimating, otherwise in tokens
+    enc = _ENC
+    if enc is None:
+        units: str | list[int] = transcript
+        per_token = _FALLBACK_CHARS_PER_TOKEN
     else:
-        metadata_block = ""
+        units = enc.encode(transcript, disallowed_special=())
+        per_token = 1
 
-    return USER_TEMPLATE.format(
-        metadata_block=metadata_block,
-        transcript=transcript.strip(),
+    limit = max_tokens - system - output_reserve
+    keep = min(len(units), budget * per_token)
+    while True:
+        if keep >= len(units):
+            kept = transcript
+        elif enc is None:
+            kept = transcript[:keep]
+        else:
+            # Byte-level tokens can split a multi-byte character (CJK, emoji);
+            # back off until the cut is on a character boundary as well
+            while True:
+                try:
+                    kept = enc.decode_bytes(units[:keep]).decode("utf-8")
+                    break
+                except UnicodeDecodeError:
+                    keep -= 1
+        message = build_user_message(kept, metadata, pre_stripped=True)
+        excess = count_tokens(message) - limit
+        if excess <= 0 or keep == 0:
+            return message
+        keep = max(0, keep - excess * per_token)
+
+
+def build_request_body(
+    transcript: str,
+    metadata: Mapping[str, Any] | None = _EMPTY_METADATA,
+    *,
+    model: str,
+    pre_stripped: bool = False,
+    compress: bool = False,
+    **params: Any,
+) -> bytes:
+    """
+    Return a complete chat-completions JSON request body as UTF-8 bytes.
+
+    The envelope and escaped system prompt are prebuilt at import; per call
+    only *model*, the user message and any extra *params* (e.g.
+    ``temperature``, ``max_completion_tokens``) are serialised.  For
+    callers that POST the body themselves rather than through an SDK.
+    """
+    user_message = build_user_message(
+        transcript, metadata, pre_stripped=pre_stripped, compress=compress
     )
+    parts = [
+        _BODY_HEAD,
+        orjson.dumps(model),
+        _BODY_MESSAGES,
+        orjson.dumps(user_message),
+        _BODY_MESSAGES_END,
+    ]
+    for key, value in params.items():
+        parts += (b',"', key.encode("utf-8"), b'":', orjson.dumps(value))
+    parts.append(b"}")
+    return b"".join(parts)
@@ -0,0 +1,58 @@
+"""
+race.py
+───────
+Helper for racing several API attempts against each other.
+
+Used by ``GroqClient`` and ``CerebrusClient`` to fan a retry wave out over
+several API keys at once, so latency under partial rate-limiting is the
+fastest attempt rather than the sum of all of them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+async def first_success(
+    attempts: Iterable[Awaitable[T]],
+    retryable: tuple[type[BaseException], ...],
+) -> T:
+    """
+    Run *attempts* concurrently and return the first successful result.
+
+    The remaining attempts are cancelled as soon as one succeeds.
+
+    Raises
+    ------
+    retryable
+        The last retryable error, when every attempt failed with one of the
+        *retryable* exception types.
+    Exception
+        Any non-retryable error, immediately; the rest of the wave is
+        cancelled.
+    """
+    tasks = [asyncio.ensure_future(attempt) for attempt in attempts]
+    last_error: BaseException | None = None
+
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                exc = task.exception()
+                if exc is None:
+                    return task.result()
+                if not isinstance(exc, retryable):
+                    raise exc
+                last_error = exc
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    assert last_error is not None
+    raise last_error
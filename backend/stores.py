@@ -0,0 +1,230 @@
+"""
+stores.py
+─────────
+Backing stores for uploaded audio, transcripts and LLM analyses.
+
+Two interchangeable backends expose the same async interface:
+
+``MemoryStore``
+    Process-local bounded LRU + TTL cache.  The default; state is lost on
+    restart and not shared between uvicorn workers.
+``RedisStore``
+    Values kept in Redis with a per-key TTL, so several workers (or hosts)
+    serve the same data and it survives a restart.  Selected by setting
+    ``REDIS_URL``.
+
+Audio files themselves always stay on disk under ``AUDIO_DIR``; the audio
+store only holds their ``{"path", "size"}`` metadata.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Any
+
+import orjson
+import redis.asyncio as redis
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def unlink_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# In-memory backend
+# ---------------------------------------------------------------------------
+class VersionedTTLCache(TTLCache):
+    """TTLCache with a ``version`` counter bumped on every insert or removal."""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize, ttl)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        try:
+            super().__delitem__(key)
+        finally:
+            self.version += 1
+
+    def clear(self):
+        # TTLCache.clear() bypasses __delitem__
+        super().clear()
+        self.version += 1
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if expired:
+            self.version += 1
+        return expired
+
+
+class AudioFileCache(VersionedTTLCache):
+    """TTLCache of ``{"path", "size", "stat"}`` entries; evicted files are deleted."""
+
+    def popitem(self):
+        key, entry = super().popitem()
+        unlink_quietly(entry["path"])
+        return key, entry
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, entry in expired:
+            unlink_quietly(entry["path"])
+        return expired
+
+
+class MemoryStore:
+    """
+    Async facade over a ``VersionedTTLCache``.
+
+    ``fragments()`` returns pre-serialised ``{"file_id": ..., <field>: ...}``
+    JSON objects for the list endpoints, rebuilt only when the cache has
+    changed since the last call instead of on every poll.
+    """
+
+    def __init__(self, cache: VersionedTTLCache, field: str) -> None:
+        self._cache = cache
+        self._field = field
+        self._version = -1
+        self._fragments: list[bytes] = []
+
+    async def get(self, key: str) -> Any | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any) -> None:
+        self._cache[key] = value
+
+    async def size(self) -> int:
+        self._cache.expire()
+        return len(self._cache)
+
+    async def fragments(self) -> list[bytes]:
+        self._cache.expire()
+        if self._version != self._cache.version:
+            self._fragments = [
+                orjson.dumps({"file_id": fid, self._field: value})
+                for fid, value in self._cache.items()
+            ]
+            self._version = self._cache.version
+        return self._fragments
+
+
+# ---------------------------------------------------------------------------
+# Redis backend
+# ---------------------------------------------------------------------------
+class RedisStore:
+    """
+    Same interface as ``MemoryStore``, backed by Redis.
+
+    Layout, for a store with prefix ``p``:
+
+    ``p:<file_id>``
+        orjson-encoded value, written with ``EX ttl``.
+    ``p:index``
+        Sorted set of file ids scored by expiry time, used for listings and
+        counts without a keyspace ``SCAN``.
+    ``p:version``
+        Counter bumped on every write or expiry sweep, so each worker only
+        rebuilds its listing fragments when some worker changed the store.
+
+    Values must be JSON-serialisable.  Unlike ``MemoryStore`` there is no
+    entry cap; size is bounded by the TTL and the server's ``maxmemory``
+    policy.  Entries evicted by Redis before their TTL are skipped in
+    listings and dropped from the index when their score passes.
+    """
+
+    def __init__(self, client: redis.Redis, prefix: str, field: str, ttl: int) -> None:
+        self._redis = client
+        self._prefix = prefix
+        self._field = field.encode()
+        self._ttl = ttl
+        self._index = f"{prefix}:index"
+        self._version_key = f"{prefix}:version"
+        self._version: bytes | None = None
+        self._fragments: list[bytes] = []
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}:{key}"
+
+    async def get(self, key: str) -> Any | None:
+        raw = await self._redis.get(self._key(key))
+        return None if raw is None else orjson.loads(raw)
+
+    async def set(self, key: str, value: Any) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._key(key), orjson.dumps(value), ex=self._ttl)
+            pipe.zadd(self._index, {key: time.time() + self._ttl})
+            pipe.incr(self._version_key)
+            await pipe.execute()
+
+    async def size(self) -> int:
+        return await self._redis.zcount(self._index, time.time(), "+inf")
+
+    async def fragments(self) -> list[bytes]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self._index, "-inf", time.time())
+            pipe.get(self._version_key)
+            removed, version = await pipe.execute()
+
+        if removed:
+            version = str(await self._redis.incr(self._version_key)).encode()
+        if version is not None and version == self._version:
+            return self._fragments
+
+        ids = await self._redis.zrange(self._index, 0, -1)
+        values = (
+            await self._redis.mget([self._key(fid.decode()) for fid in ids])
+            if ids
+            else []
+        )
+        # Stored values are already JSON, so splice them in without decoding
+        self._fragments = [
+            b'{"file_id":%s,"%s":%s}' % (orjson.dumps(fid.decode()), self._field, raw)
+            for fid, raw in zip(ids, values)
+            if raw is not None
+        ]
+        self._version = version
+        return self._fragments
+
+
+# ---------------------------------------------------------------------------
+# Disk janitor for spooled audio
+# ---------------------------------------------------------------------------
+def sweep_audio_dir(audio_dir: str, max_age_seconds: float) -> int:
+    """
+    Delete ``.wav`` files under *audio_dir* older than *max_age_seconds*.
+
+    With ``RedisStore`` entries expire inside Redis, so no process sees the
+    eviction and unlinks the file the way ``AudioFileCache`` does; and with
+    either backend, files spooled before a restart or crash are no longer
+    referenced by any store.  A periodic sweep with the store TTL as
+    *max_age_seconds* reclaims both.  Returns the number of files deleted.
+    """
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    with os.scandir(audio_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".wav"):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Another worker swept it first
+                continue
+    if removed:
+        logger.info("[Stores] Swept %d expired audio file(s)", removed)
+    return removed